@@ -16,14 +16,30 @@ mystats.pro – FINAL PARSER (header-aware, EasyStats)
     - data/derived/player_totals.json
     - data/derived/team_leaders.json
     - data/derived/team_records.json
+- Derived files are updated incrementally from the new game(s); for a
+  re-imported game the affected totals and records are recomputed from
+  the boxscores of its season.
+  --full-rebuild rebuilds them from every boxscore, as does any run
+  whose boxscores on disk differ from those recorded in _folded.json
+- --batch DIR processes every export in DIR in one run (one team),
+  updating the derived files once at the end
 """
 
 import argparse
+import functools
+import heapq
 import json
 import re
+from operator import itemgetter
 from pathlib import Path
 from datetime import datetime
-from bs4 import BeautifulSoup
+import lxml.html
+from lxml import etree
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 # -------------------------------------------------------------------
 # Directories
@@ -37,36 +53,115 @@ for d in (DATA, BOX, DER):
     d.mkdir(parents=True, exist_ok=True)
 
 
+# -------------------------------------------------------------------
+# Compiled regex patterns
+# -------------------------------------------------------------------
+
+_RE_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+_RE_MA = re.compile(r"^(\d+)\s*-\s*(\d+)$")
+_RE_JERSEY = re.compile(r"^#?\d+\s+")
+
+# True if a table has any 'M-A' cell; the scan runs inside lxml (EXSLT regex)
+_HAS_MA_CELL = etree.XPath(
+    r'boolean(.//td[re:test(normalize-space(.), "^\d+\s*-\s*\d+$")])',
+    namespaces={"re": "http://exslt.org/regular-expressions"},
+)
+
+
 # -------------------------------------------------------------------
 # Basic utils
 # -------------------------------------------------------------------
 
 def read_json(path: Path, default):
-    if not path.exists() or path.stat().st_size == 0:
+    # One read instead of exists() + stat() + read
+    try:
+        buf = path.read_bytes()
+    except FileNotFoundError:
+        return default
+    if not buf:
         return default
     try:
-        return json.loads(path.read_text(encoding="utf8"))
-    except Exception:
+        if orjson is not None:
+            return orjson.loads(buf)
+        return json.loads(buf)
+    except ValueError:
+        # malformed JSON (orjson.JSONDecodeError / json.JSONDecodeError)
         return default
 
 
-def write_json(path: Path, data):
-    path.write_text(json.dumps(data, indent=2, ensure_ascii=False), encoding="utf8")
+def dump_json(data, *, pretty=False) -> bytes:
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS
+        if pretty:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(data, option=option)
+    if pretty:
+        return json.dumps(data, indent=2, ensure_ascii=False).encode("utf8")
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False).encode("utf8")
+
+
+def write_json(path: Path, data, *, pretty=False):
+    """
+    Derived files are machine-read, so they are written compact.
+    pretty=True keeps the 2-space indent for files a human opens.
+    """
+    path.write_bytes(dump_json(data, pretty=pretty))
 
 
+def append_json(path: Path, item):
+    """
+    Append item to the pretty-printed JSON array in path without
+    re-reading it: the closing ']' is overwritten with ',<item>]', giving
+    the same bytes as a full pretty=True rewrite. Missing files, empty
+    arrays and anything unexpected fall back to read + rewrite.
+    """
+    try:
+        with path.open("r+b") as fh:
+            size = fh.seek(0, 2)
+            start = max(size - 64, 0)
+            fh.seek(start)
+            tail = fh.read().rstrip()
+            last = tail[:-1].rstrip()
+            if tail.endswith(b"]") and last.endswith(b"}"):
+                lines = dump_json(item, pretty=True).split(b"\n")
+                body = b"\n".join(b"  " + line for line in lines)
+                fh.seek(start + len(last))
+                fh.write(b",\n" + body + b"\n]")
+                fh.truncate()
+                return
+    except FileNotFoundError:
+        pass
+
+    arr = read_json(path, [])
+    arr.append(item)
+    write_json(path, arr, pretty=True)
+
+
+@functools.lru_cache(maxsize=1024)
 def norm_id(s: str) -> str:
-    return re.sub(r"[^a-z0-9]+", "-", s.lower()).strip("-")
+    return _RE_NON_ALNUM.sub("-", s.lower()).strip("-")
+
+
+_EMPTY_CELLS = frozenset(("", "-", "–"))
 
 
 def to_num(x):
+    """
+    Most cells are plain counts ('3', '12'), so those take an int()
+    fast path before the float() fallback.
+    """
     if x is None:
         return 0
     x = x.strip()
-    if x in ("", "-", "–"):
+    if x in _EMPTY_CELLS:
         return 0
+    if x.isdecimal():
+        return int(x)
+    if x.endswith("%"):
+        x = x[:-1]
     try:
         return float(x)
-    except Exception:
+    except ValueError:
         return 0
 
 
@@ -74,8 +169,7 @@ def split_made_attempt(s: str):
     """
     '10-16' -> (10,16)
     """
-    s = s.strip()
-    m = re.match(r"^(\d+)\s*-\s*(\d+)$", s)
+    m = _RE_MA.match(s.strip())
     if not m:
         return 0, 0
     return int(m.group(1)), int(m.group(2))
@@ -85,7 +179,7 @@ def stats_all_zero(stats: dict) -> bool:
     """
     DNP rule: only skip if *all* stats are zero.
     """
-    return all(v == 0 for v in stats.values())
+    return not any(stats.values())
 
 
 # -------------------------------------------------------------------
@@ -107,6 +201,7 @@ def load_players_index():
 # Name handling
 # -------------------------------------------------------------------
 
+@functools.lru_cache(maxsize=1024)
 def normalize_abbrev_name(name: str) -> str:
     """
     Strip jersey numbers:
@@ -114,11 +209,29 @@ def normalize_abbrev_name(name: str) -> str:
       '11 J. Todd'  -> 'J. Todd'
     """
     name = name.strip()
-    name = re.sub(r"^#?\d+\s+", "", name)
+    name = _RE_JERSEY.sub("", name)
     return name
 
 
-def match_player_name(abbrev: str, players_index):
+def build_name_lookup(players_index):
+    """
+    Hash lookups for match_player_name, built once per players_index:
+      by_full: 'josh todd' -> first pid with that full name
+      by_last: 'todd'      -> [(pid, first name or None), ...] in file order
+    """
+    by_full = {}
+    by_last = {}
+    for pid, pdata in players_index.items():
+        full_name = pdata["name"].lower()
+        by_full.setdefault(full_name, pid)
+        full = full_name.split()
+        if full:
+            first = full[0] if len(full) >= 2 else None
+            by_last.setdefault(full[-1], []).append((pid, first))
+    return {"by_full": by_full, "by_last": by_last}
+
+
+def match_player_name(abbrev: str, name_lookup):
     """
     Map 'J. Todd' -> player_id in players.json using:
       1) exact name match
@@ -135,28 +248,36 @@ def match_player_name(abbrev: str, players_index):
     last_name = last_name.replace(".", "")
 
     # 1) exact match
-    for pid, pdata in players_index.items():
-        if pdata["name"].lower() == abbrev:
-            return pid
+    pid = name_lookup["by_full"].get(abbrev)
+    if pid is not None:
+        return pid
 
     # 2) initial + last
-    for pid, pdata in players_index.items():
-        full = pdata["name"].lower().split()
-        if len(full) >= 2 and full[-1] == last_name and full[0].startswith(initial):
+    candidates = name_lookup["by_last"].get(last_name, [])
+    for pid, first in candidates:
+        if first is not None and first.startswith(initial):
             return pid
 
     # 3) unique last
-    candidates = []
-    for pid, pdata in players_index.items():
-        full = pdata["name"].lower().split()
-        if full and full[-1] == last_name:
-            candidates.append(pid)
     if len(candidates) == 1:
-        return candidates[0]
+        return candidates[0][0]
 
     return None
 
 
+def make_name_matcher(players_index):
+    """
+    match_player_name bound to one players_index and memoised per name,
+    since the same 'J. Todd' comes back in every boxscore of a batch.
+    """
+    name_lookup = build_name_lookup(players_index)
+
+    @functools.lru_cache(maxsize=4096)
+    def match(abbrev: str):
+        return match_player_name(abbrev, name_lookup)
+    return match
+
+
 # -------------------------------------------------------------------
 # Select the full M-A table
 # -------------------------------------------------------------------
@@ -167,10 +288,8 @@ def select_full_stats_table(all_tables):
     We pick the table that contains values like '10-16', '5-12', etc.
     """
     for table in all_tables:
-        for td in table.find_all("td"):
-            txt = td.get_text(strip=True)
-            if re.match(r"^\d+\s*-\s*\d+$", txt):
-                return table
+        if _HAS_MA_CELL(table):
+            return table
     return all_tables[0] if all_tables else None
 
 
@@ -178,6 +297,7 @@ def select_full_stats_table(all_tables):
 # Header normalisation + mapping
 # -------------------------------------------------------------------
 
+@functools.lru_cache(maxsize=1024)
 def norm_header(h: str) -> str:
     """
     Normalise a header cell to a simple key:
@@ -198,7 +318,7 @@ def norm_header(h: str) -> str:
     h = h.replace("3-pt", "3pt")
 
     # remove non-alphanumerics
-    h = re.sub(r"[^a-z0-9]+", "", h)
+    h = _RE_NON_ALNUM.sub("", h)
     return h
 
 
@@ -231,79 +351,97 @@ HEADER_MAP = {
     "pts": "pts",
 }
 
+# M-A columns -> the (made, attempted) stats they fill
+MA_COLUMNS = {
+    "fg": ("fgm", "fga"),
+    "fg3": ("fg3m", "fg3a"),
+    "ft": ("ftm", "fta"),
+}
+
+# HTML percentages and REB are ignored – we compute them from M-A / OREB+DREB
+IGNORED_COLUMNS = {"fg_pct_src", "fg3_pct_src", "ft_pct_src", "reb"}
+
 
 # -------------------------------------------------------------------
 # Parse full player table
 # -------------------------------------------------------------------
 
-def parse_player_table(table, players_index):
+# Fixed order of the per-player stats dict (and of the stat vectors
+# used when aggregating).
+STAT_ORDER = (
+    "fgm", "fga",
+    "fg3m", "fg3a",
+    "ftm", "fta",
+    "oreb", "dreb",
+    "reb",
+    "ast", "stl",
+    "blk", "turnovers",
+    "pf", "pts",
+    "fg_pct", "fg3_pct", "ft_pct",
+)
+
+# Every row starts from a copy of this instead of a fresh dict literal
+STATS_TEMPLATE = dict.fromkeys(STAT_ORDER, 0)
+
+
+def parse_player_table(table, match_name):
     players = []
     if table is None:
         return players
 
-    # Find header row (first tr with any th)
-    header_tr = None
-    for tr in table.find_all("tr"):
-        if tr.find("th"):
-            header_tr = tr
+    # Find header row (first tr with any th); rows are listed once and sliced
+    rows = table.xpath(".//tr")
+    for h, header_tr in enumerate(rows):
+        if header_tr.find(".//th") is not None:
             break
-    if header_tr is None:
+    else:
         return players
 
-    header_cells = header_tr.find_all("th")
-    header_keys = []
-    for th in header_cells:
-        key = HEADER_MAP.get(norm_header(th.get_text(strip=True)), None)
-        header_keys.append(key)
-
-    # Data rows = trs after header_tr that contain td cells
-    for tr in header_tr.find_all_next("tr"):
-        tds = tr.find_all("td")
+    header_keys = tuple(
+        HEADER_MAP.get(norm_header(th.text_content().strip()), None)
+        for th in header_tr.iter("th")
+    )
+
+    # (column index, key, M-A target keys or None) for the columns we read;
+    # the M-A dispatch is resolved here, once per table
+    cols = [
+        (i, key, MA_COLUMNS.get(key)) for i, key in enumerate(header_keys)
+        if key is not None and key not in IGNORED_COLUMNS
+    ]
+
+    # Data rows = trs of this table after header_tr that contain td cells
+    for tr in rows[h + 1:]:
+        tds = list(tr.iter("td"))
         if not tds:
             continue
 
-        raw_name = tds[0].get_text(strip=True)
+        raw_name = tds[0].text_content().strip()
         if not raw_name:
             continue
 
         name = normalize_abbrev_name(raw_name)
-        matched_pid = match_player_name(name, players_index)
+        matched_pid = match_name(name)
         pid = matched_pid or norm_id(name)
 
         # Initialise stats
-        stats = {
-            "fgm": 0, "fga": 0,
-            "fg3m": 0, "fg3a": 0,
-            "ftm": 0, "fta": 0,
-            "oreb": 0, "dreb": 0,
-            "reb": 0,
-            "ast": 0, "stl": 0,
-            "blk": 0, "turnovers": 0,
-            "pf": 0, "pts": 0,
-            "fg_pct": 0, "fg3_pct": 0, "ft_pct": 0,
-        }
+        stats = STATS_TEMPLATE.copy()
 
         # Loop through columns with header keys
-        for i, td in enumerate(tds):
-            val = td.get_text(strip=True)
-            key = header_keys[i] if i < len(header_keys) else None
-            if key is None:
-                continue
+        for i, key, ma in cols:
+            if i >= len(tds):
+                break
+            # to_num / split_made_attempt strip the text themselves
+            val = tds[i].text_content()
 
-            if key == "fg":
-                fgm, fga = split_made_attempt(val)
-                stats["fgm"], stats["fga"] = fgm, fga
-            elif key == "fg3":
-                m3, a3 = split_made_attempt(val)
-                stats["fg3m"], stats["fg3a"] = m3, a3
-            elif key == "ft":
-                ftm, fta = split_made_attempt(val)
-                stats["ftm"], stats["fta"] = ftm, fta
-            elif key in ("fg_pct_src", "fg3_pct_src", "ft_pct_src"):
-                # ignore HTML percentages – we compute from M-A
-                continue
-            else:
+            if ma is None:
                 stats[key] = to_num(val)
+            else:
+                stats[ma[0]], stats[ma[1]] = split_made_attempt(val)
+
+        # DNP skip rule. REB and the percentages are derived from the
+        # parsed cells and are zero whenever those are, so test first.
+        if stats_all_zero(stats):
+            continue
 
         # REB = OREB + DREB (override HTML REB)
         stats["reb"] = stats["oreb"] + stats["dreb"]
@@ -313,10 +451,6 @@ def parse_player_table(table, players_index):
         stats["fg3_pct"] = (stats["fg3m"] / stats["fg3a"] * 100) if stats["fg3a"] > 0 else 0
         stats["ft_pct"] = (stats["ftm"] / stats["fta"] * 100) if stats["fta"] > 0 else 0
 
-        # DNP skip rule
-        if stats_all_zero(stats):
-            continue
-
         players.append({
             "player_id": pid,
             "name": name,
@@ -326,6 +460,42 @@ def parse_player_table(table, players_index):
     return players
 
 
+# -------------------------------------------------------------------
+# Boxscores
+# -------------------------------------------------------------------
+
+def fill_missing_stats(box):
+    """
+    Count stats missing from an older or hand-edited boxscore as 0, so the
+    builders can read every STAT_ORDER key directly.
+    """
+    for p in box["players"]:
+        st = p["stats"]
+        if not st.keys() >= STATS_TEMPLATE.keys():
+            p["stats"] = {**STATS_TEMPLATE, **st}
+    return box
+
+
+def load_boxscores(known=None):
+    """
+    Load every boxscore, keyed by game_id, in file name order.
+
+    known: optional {file name: box} for boxscores this run just wrote;
+    those are taken from memory instead of being read back.
+    """
+    known = known or {}
+    boxscores = {}
+    for f in sorted(BOX.glob("*.json")):
+        g = known.get(f.name)
+        if g is None:
+            g = read_json(f, None)
+            if g:
+                fill_missing_stats(g)
+        if g:
+            boxscores[g["game_id"]] = g
+    return boxscores
+
+
 # -------------------------------------------------------------------
 # Derived stats
 # -------------------------------------------------------------------
@@ -338,149 +508,286 @@ LEADER_STATS = [
     "ast", "stl", "blk", "turnovers", "pf"
 ]
 
+# Leaders / records kept per team, season and stat
+TOP_N = 10
+_record_tuple = itemgetter("value", "player_id", "date")
+
+
+def _record_rank(rec):
+    # (value, player_id, date): highest value first, ties to the earlier
+    # game and then player_id, so every path keeps the same entries
+    val, pid, date = rec
+    return (-val, date, pid)
+
+
+def top_records(arr):
+    """
+    Record dicts for the top TOP_N (value, player_id, date) tuples.
+    """
+    return [
+        {"player_id": pid, "value": val, "date": date}
+        for val, pid, date in heapq.nsmallest(TOP_N, arr, key=_record_rank)
+    ]
+
 
-def build_player_totals(boxscores):
-    agg = {}
+def scan_boxscores(boxscores):
+    """
+    Single pass over the games that feeds both builders:
+      groups: (player_id, team_id, season, type) -> [stats, ...]
+      values: (team_id, season) -> one [(value, player_id, date), ...]
+              list per LEADER_STATS entry, in the same order
+    Zero values never make a record, so they are not collected.
+    """
+    leader_vector = itemgetter(*LEADER_STATS)
+    groups = {}
+    values = {}
     for g in boxscores.values():
+        tid = g["team_id"]
         season = g["season"]
         gtype = g["type"]
+        date = g["date"]
+        per_stat = values.get((tid, season))
+        if per_stat is None:
+            per_stat = values[(tid, season)] = [[] for _ in LEADER_STATS]
         for p in g["players"]:
             pid = p["player_id"]
             st = p["stats"]
-            key = (pid, season, gtype)
-            if key not in agg:
-                agg[key] = {
-                    "player_id": pid,
-                    "season": season,
-                    "type": gtype,
-                    "games": 0,
-                    "sum": {k: 0 for k in st}
-                }
-            agg[key]["games"] += 1
-            for k, v in st.items():
-                agg[key]["sum"][k] += v
+            key = (pid, tid, season, gtype)
+            rows = groups.get(key)
+            if rows is None:
+                rows = groups[key] = []
+            rows.append(st)
+
+            for arr, val in zip(per_stat, leader_vector(st)):
+                if val != 0:
+                    arr.append((val, pid, date))
+    return groups, values
 
+
+def build_player_totals(groups):
+    """
+    Reduce each (player_id, team_id, season, type) group from scan_boxscores
+    column-wise: zip(*rows) transposes the rows and sum() runs per column,
+    so there is no per-stat dict update inside the game loop.
+    Each stats dict is turned into a STAT_ORDER tuple by one itemgetter call.
+    A group always holds at least one game, so averages divide the summed
+    tuple directly.
+    """
+    stat_vector = itemgetter(*STAT_ORDER)
     out = []
-    for (pid, season, gtype), rec in agg.items():
-        games = rec["games"]
-        sums = rec["sum"]
-        av = {k: (v / games if games else 0) for k, v in sums.items()}
+    for (pid, tid, season, gtype), rows in groups.items():
+        sums = tuple(map(sum, zip(*map(stat_vector, rows))))
+        games = len(rows)
         out.append({
             "player_id": pid,
+            "team_id": tid,
             "season": season,
             "type": gtype,
             "games": games,
-            "totals": sums,
-            "averages": av
+            "totals": dict(zip(STAT_ORDER, sums)),
+            "averages": dict(zip(STAT_ORDER, [v / games for v in sums]))
         })
     return out
 
 
-def build_team_leaders(player_totals, players_index):
+def build_team_leaders(player_totals, only=None):
+    """
+    Group (player_id, *LEADER_STATS averages) rows once per team/season/type,
+    using each record's own team, so a player on two teams is ranked on
+    each team by the games played for it. Then pick the top TOP_N per stat
+    column. Leader dicts are only built for the players that make it. Rows
+    are sorted by player_id first, so tied values always rank the same way
+    (nlargest keeps input order for ties).
+
+    only: optional set of (team_id, season, type) groups to build.
+    """
     grouped = {}
     for rec in player_totals:
         pid = rec["player_id"]
-        season = rec["season"]
-        gtype = rec["type"]
         av = rec["averages"]
-        teams = players_index.get(pid, {}).get("teams", [])
-        for tid in teams:
-            key = (tid, season, gtype)
-            if key not in grouped:
-                grouped[key] = {s: [] for s in LEADER_STATS}
-            for stat in LEADER_STATS:
-                grouped[key][stat].append({
-                    "player_id": pid,
-                    "value": av.get(stat, 0)
-                })
+        key = (rec["team_id"], rec["season"], rec["type"])
+        if only is not None and key not in only:
+            continue
+        rows = grouped.get(key)
+        if rows is None:
+            rows = grouped[key] = []
+        rows.append((pid, *(av.get(stat, 0) for stat in LEADER_STATS)))
 
     results = []
-    for (tid, season, gtype), stat_map in grouped.items():
-        for stat, arr in stat_map.items():
-            ranked = sorted(arr, key=lambda x: x["value"], reverse=True)
+    for (tid, season, gtype), rows in grouped.items():
+        rows.sort(key=itemgetter(0))
+        for i, stat in enumerate(LEADER_STATS, start=1):
+            top = heapq.nlargest(TOP_N, rows, key=itemgetter(i))
             results.append({
                 "team_id": tid,
                 "season": season,
                 "type": gtype,
                 "stat": stat,
-                "leaders": ranked[:10]
+                "leaders": [{"player_id": r[0], "value": r[i]} for r in top]
             })
     return results
 
 
-def build_team_records(boxscores):
-    out = {}
-    for g in boxscores.values():
+def build_team_records(values):
+    """
+    Single-game values come from scan_boxscores as (value, player_id, date)
+    tuples; record dicts are only built for the top TOP_N of each
+    team/season/stat.
+    """
+    results = []
+    for (tid, season), per_stat in values.items():
+        for stat, arr in zip(LEADER_STATS, per_stat):
+            if not arr:
+                continue
+            results.append({
+                "team_id": tid,
+                "season": season,
+                "stat": stat,
+                "records": top_records(arr)
+            })
+    return results
+
+
+# -------------------------------------------------------------------
+# Incremental derived updates
+# -------------------------------------------------------------------
+
+def add_to_player_totals(player_totals, new_boxes):
+    """
+    Add the games in new_boxes to an existing player_totals list in place.
+    Returns the (player_id, team_id, season, type) keys that changed.
+    """
+    index = {
+        (r["player_id"], r["team_id"], r["season"], r["type"]): r
+        for r in player_totals
+    }
+    touched = set()
+    for g in new_boxes:
         tid = g["team_id"]
         season = g["season"]
-        date = g["date"]
+        gtype = g["type"]
         for p in g["players"]:
-            pid = p["player_id"]
-            st = p["stats"]
-            for stat in LEADER_STATS:
-                val = st.get(stat, 0)
-                if val == 0:
-                    continue
-                key = (tid, season, stat)
-                if key not in out:
-                    out[key] = []
-                out[key].append({"player_id": pid, "value": val, "date": date})
+            key = (p["player_id"], tid, season, gtype)
+            rec = index.get(key)
+            if rec is None:
+                rec = index[key] = {
+                    "player_id": p["player_id"],
+                    "team_id": tid,
+                    "season": season,
+                    "type": gtype,
+                    "games": 0,
+                    "totals": STATS_TEMPLATE.copy(),
+                    "averages": {},
+                }
+                player_totals.append(rec)
+            rec["games"] += 1
+            sums = rec["totals"]
+            for k, v in p["stats"].items():
+                sums[k] = sums.get(k, 0) + v
+            touched.add(key)
+
+    for key in touched:
+        rec = index[key]
+        games = rec["games"]
+        rec["averages"] = {k: (v / games if games else 0) for k, v in rec["totals"].items()}
+    return touched
 
-    results = []
-    for (tid, season, stat), arr in out.items():
-        ranked = sorted(arr, key=lambda x: x["value"], reverse=True)
-        results.append({
-            "team_id": tid,
-            "season": season,
-            "stat": stat,
-            "records": ranked[:10]
-        })
-    return results
+
+def merge_team_records(team_records, new_boxes):
+    """
+    Merge the single-game values of new_boxes into an existing team_records
+    list in place. The top TOP_N of (old top TOP_N + new game) is exact.
+    """
+    index = {(r["team_id"], r["season"], r["stat"]): r for r in team_records}
+    _, values = scan_boxscores({g["game_id"]: g for g in new_boxes})
+    for rec in build_team_records(values):
+        key = (rec["team_id"], rec["season"], rec["stat"])
+        old = index.get(key)
+        if old is None:
+            index[key] = rec
+            team_records.append(rec)
+        else:
+            old["records"] = top_records(
+                map(_record_tuple, old["records"] + rec["records"])
+            )
 
 
 # -------------------------------------------------------------------
 # MAIN
 # -------------------------------------------------------------------
 
-def main():
-    parser = argparse.ArgumentParser()
-    parser.add_argument("htmlfile")
-    parser.add_argument("--date")
-    parser.add_argument("--season")
-    parser.add_argument("--type")
-    parser.add_argument("--team-id")
-    parser.add_argument("--team-name")
-    parser.add_argument("--score")
-    parser.add_argument("--opp")
-    parser.add_argument("--opp-score")
-    args = parser.parse_args()
-
-    players_index = load_players_index()
-
-    # Date
-    if args.date:
+def parse_date(raw):
+    """
+    'dd/mm/yyyy' -> 'yyyy-mm-dd'; anything else falls back to today.
+    """
+    if raw:
         try:
-            d = datetime.strptime(args.date, "%d/%m/%Y")
+            d = datetime.strptime(raw, "%d/%m/%Y")
         except Exception:
             d = datetime.now()
     else:
         d = datetime.now()
-    date_str = d.strftime("%Y-%m-%d")
+    return d.strftime("%Y-%m-%d")
+
+
+def _check_date(raw):
+    datetime.strptime(raw, "%d/%m/%Y")
+
+
+def _check_required(raw):
+    if not raw:
+        raise ValueError(raw)
+
+
+def prompt_until(label, check, hint):
+    """
+    Ask until check(answer) stops raising ValueError. Batch answers are all
+    collected before anything is written, so a typo must neither fall back
+    to a default (a blank date would become today for every file) nor
+    abort the run halfway through.
+    """
+    while True:
+        raw = input(label).strip()
+        try:
+            check(raw)
+        except ValueError:
+            print(f"  expected {hint}")
+            continue
+        return raw
+
+
+def resolve_team_args(args):
+    """
+    Fill in the fields shared by every game of a run (prompting if needed).
+    """
+    args.season = args.season or input("Season: ").strip() or "2025"
+    args.type = args.type or input("Game type (regular/playoff): ").strip() or "regular"
+    args.team_id = (args.team_id or input("Team ID: ").strip()).lower().replace(" ", "-")
+    args.team_name = args.team_name or input("Team Name: ").strip()
 
-    season = args.season or input("Season: ").strip() or "2025"
-    gtype = args.type or input("Game type (regular/playoff): ").strip() or "regular"
 
-    team_id = (args.team_id or input("Team ID: ").strip()).lower().replace(" ", "-")
-    team_name = args.team_name or input("Team Name: ").strip()
+def process_one(html_path: Path, args, match_name):
+    """
+    Parse one EasyStats export, write its boxscore and add it to games.json.
+    Derived stats are left to the caller.
+
+    Returns (box, old); old is the boxscore previously stored under the
+    same game_id (None for a new game), so its contribution can be undone.
+    """
+    date_str = parse_date(args.date)
+    season = args.season
+    gtype = args.type
+    team_id = args.team_id
+    team_name = args.team_name
     opponent = args.opp or input("Opponent: ").strip()
     score = int(args.score or input("Team Score: "))
     opp_score = int(args.opp_score or input("Opponent Score: "))
 
-    html = Path(args.htmlfile).read_text(encoding="utf8")
-    soup = BeautifulSoup(html, "lxml")
-    all_tables = soup.find_all("table")
+    html = html_path.read_text(encoding="utf8")
+    root = lxml.html.fromstring(html)
+    all_tables = list(root.iter("table"))
     full_table = select_full_stats_table(all_tables)
-    players = parse_player_table(full_table, players_index)
+    players = parse_player_table(full_table, match_name)
 
     # Team totals
     totals = {}
@@ -504,12 +811,12 @@ def main():
     }
 
     out_path = BOX / f"{gid}.json"
-    write_json(out_path, box)
+    old = read_json(out_path, None)
+    write_json(out_path, box, pretty=True)
     print(f"✓ Boxscore written: {out_path}")
 
     # Update games.json
-    games = read_json(DATA / "games.json", [])
-    games.append({
+    append_json(DATA / "games.json", {
         "id": gid,
         "team_id": team_id,
         "date": date_str,
@@ -520,24 +827,193 @@ def main():
         "opp_score": opp_score,
         "boxscore_json": str(out_path),
     })
-    write_json(DATA / "games.json", games)
+    return box, old
 
-    # Derived from all boxscores for this team
-    boxscores = {}
-    for f in BOX.glob("*.json"):
-        g = read_json(f, None)
-        if g and g["team_id"] == team_id:
-            boxscores[g["game_id"]] = g
 
-    player_totals = build_player_totals(boxscores)
-    team_leaders = build_team_leaders(player_totals, players_index)
-    team_records = build_team_records(boxscores)
+DERIVED_FILES = (
+    DER / "player_totals.json",
+    DER / "team_leaders.json",
+    DER / "team_records.json",
+)
+
+# Sorted boxscore file names the derived files were built from
+FOLDED = DER / "_folded.json"
+
+
+def rebuild_derived(new_boxes=()):
+    # Derived from all boxscores; the ones just written come from memory
+    boxscores = load_boxscores({f"{g['game_id']}.json": g for g in new_boxes})
+
+    groups, values = scan_boxscores(boxscores)
+    player_totals = build_player_totals(groups)
+    team_leaders = build_team_leaders(player_totals)
+    team_records = build_team_records(values)
 
     write_json(DER / "player_totals.json", player_totals)
     write_json(DER / "team_leaders.json", team_leaders)
     write_json(DER / "team_records.json", team_records)
 
     print("✓ Derived stats updated.")
+
+
+def update_derived(new_boxes, old_boxes=()):
+    """
+    Fold newly added games into the existing derived files instead of
+    re-reading every boxscore. Leaders are rebuilt only for the
+    (team, season, type) groups whose players changed.
+
+    old_boxes are the previous versions of re-imported games. Taking them
+    back out of float sums would leave rounding residue, and a dropped
+    record can only be refilled from the other games, so in that case the
+    affected player totals and team/season records are recomputed from the
+    boxscores of the seasons involved.
+
+    A full rebuild adds games up in file name (date) order. The same is done
+    for a game that sorts before an existing boxscore, so float sums come
+    out identical either way.
+    """
+    player_totals = read_json(DER / "player_totals.json", [])
+    team_leaders = read_json(DER / "team_leaders.json", [])
+    team_records = read_json(DER / "team_records.json", [])
+
+    known = {f"{g['game_id']}.json": g for g in new_boxes}
+    new_boxes = [known[name] for name in sorted(known)]
+    last = max((f.name for f in BOX.glob("*.json") if f.name not in known), default="")
+    out_of_order = min(known) < last
+
+    if old_boxes or out_of_order:
+        changed = (*old_boxes, *new_boxes)
+        seasons = {g["season"] for g in changed}
+        boxscores = load_boxscores(known)
+        scanned, values = scan_boxscores({
+            gid: g for gid, g in boxscores.items() if g["season"] in seasons
+        })
+
+        touched = {
+            (p["player_id"], g["team_id"], g["season"], g["type"])
+            for g in changed for p in g["players"]
+        }
+        player_totals = [
+            r for r in player_totals
+            if (r["player_id"], r["team_id"], r["season"], r["type"])
+            not in touched
+        ]
+        player_totals += build_player_totals(
+            {k: rows for k, rows in scanned.items() if k in touched}
+        )
+
+        rescan = {(g["team_id"], g["season"]) for g in changed}
+        team_records = [
+            r for r in team_records
+            if (r["team_id"], r["season"]) not in rescan
+        ]
+        team_records += build_team_records(
+            {k: per_stat for k, per_stat in values.items() if k in rescan}
+        )
+    else:
+        touched = add_to_player_totals(player_totals, new_boxes)
+        merge_team_records(team_records, new_boxes)
+
+    groups = {(tid, season, gtype) for _, tid, season, gtype in touched}
+    team_leaders = [
+        e for e in team_leaders
+        if (e["team_id"], e["season"], e["type"]) not in groups
+    ]
+    team_leaders += build_team_leaders(player_totals, only=groups)
+
+    write_json(DER / "player_totals.json", player_totals)
+    write_json(DER / "team_leaders.json", team_leaders)
+    write_json(DER / "team_records.json", team_records)
+
+    print("✓ Derived stats updated (incremental).")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("htmlfile", nargs="?")
+    parser.add_argument("--batch", metavar="DIR",
+                        help="process every *.html in DIR for one team, "
+                             "updating derived stats once at the end")
+    parser.add_argument("--full-rebuild", action="store_true",
+                        help="rebuild derived stats from every boxscore "
+                             "instead of updating them incrementally")
+    parser.add_argument("--date")
+    parser.add_argument("--season")
+    parser.add_argument("--type")
+    parser.add_argument("--team-id")
+    parser.add_argument("--team-name")
+    parser.add_argument("--score")
+    parser.add_argument("--opp")
+    parser.add_argument("--opp-score")
+    args = parser.parse_args()
+    if not args.htmlfile and not args.batch:
+        parser.error("an htmlfile or --batch DIR is required")
+    if args.batch:
+        if args.htmlfile:
+            parser.error("give either an htmlfile or --batch DIR, not both")
+        per_game = [f"--{k.replace('_', '-')}"
+                    for k in ("date", "opp", "score", "opp_score")
+                    if getattr(args, k)]
+        if per_game:
+            parser.error(f"{', '.join(per_game)} cannot be used with --batch "
+                         "(they are prompted for every file)")
+
+    players_index = load_players_index()
+    match_name = make_name_matcher(players_index)
+    resolve_team_args(args)
+
+    results = []
+    if args.batch:
+        files = sorted(Path(args.batch).glob("*.html"))
+        if not files:
+            parser.error(f"no *.html files in {args.batch}")
+        # Per-game fields differ for every file, so they are always prompted,
+        # all of them before the first boxscore is written. Two files on one
+        # date would share a game_id (the second overwriting the first), so
+        # that aborts the run.
+        games = {}
+        seen = {}
+        for html_path in files:
+            print(f"-- {html_path.name}")
+            game_args = argparse.Namespace(**vars(args))
+            game_args.date = prompt_until("Date (dd/mm/yyyy): ", _check_date,
+                                          "dd/mm/yyyy")
+            gid = f"game-{parse_date(game_args.date)}-{args.team_id}"
+            if gid in seen:
+                parser.error(f"{seen[gid]} and {html_path.name} are both {gid}")
+            seen[gid] = html_path.name
+            game_args.opp = prompt_until("Opponent: ", _check_required, "a name")
+            game_args.score = prompt_until("Team Score: ", int, "a whole number")
+            game_args.opp_score = prompt_until("Opponent Score: ", int,
+                                               "a whole number")
+            games[html_path] = game_args
+
+        for html_path, game_args in games.items():
+            print(f"-- {html_path.name}")
+            results.append(process_one(html_path, game_args, match_name))
+    else:
+        results.append(process_one(Path(args.htmlfile), args, match_name))
+
+    # Adding to the derived files is only right if they already cover every
+    # other boxscore on disk. An interrupted run, files from an older parser
+    # or a deleted boxscore break that, and so do missing derived files:
+    # rebuild from scratch.
+    new_boxes = [box for box, _ in results]
+    on_disk = {f.name for f in BOX.glob("*.json")}
+    folded = read_json(FOLDED, None)
+    incremental = (
+        not args.full_rebuild
+        and folded is not None
+        and all(f.exists() for f in DERIVED_FILES)
+        and on_disk == set(folded) | {f"{g['game_id']}.json" for g in new_boxes}
+    )
+    if incremental:
+        old_boxes = [old for _, old in results if old]
+        update_derived(new_boxes, old_boxes)
+    else:
+        rebuild_derived(new_boxes)
+    # Written last, so a run that dies before this point forces a rebuild
+    write_json(FOLDED, sorted(on_disk))
     print("✓ DONE.")
 
 